@@ -1,14 +1,29 @@
+import hashlib
 import json
 import os
 import re
+import signal
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import Any, Optional
-from urllib.parse import parse_qs, urlparse
+from functools import lru_cache
+from itertools import chain
+from typing import Any, Callable, Iterable, Optional, Union
+from urllib.parse import urlparse
 
-import requests
 import streamlit as st
-from bs4 import BeautifulSoup
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+    from bs4 import BeautifulSoup
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 USER_AGENT = (
@@ -22,11 +37,35 @@ DESKTOP_USER_AGENT = (
 )
 
 URL_PATTERN = re.compile(r"https?://[^\s\"'<>\\]+", flags=re.I)
-IMAGE_EXT_PATTERN = re.compile(r"\.(?:jpg|jpeg|png|webp|avif|gif)(?:$|\?)", flags=re.I)
-VIDEO_EXT_PATTERN = re.compile(r"\.(?:mp4|m3u8|mov|webm)(?:$|\?)", flags=re.I)
+URL_BYTES_PATTERN = re.compile(rb"https?://[^\s\"'<>\\]+", flags=re.I)
+TRAILING_PUNCT_PATTERN = re.compile(r"[，。,.]+$")
+# One scan yields every media/static extension in a URL; callers dispatch on the set.
+MEDIA_EXT_PATTERN = re.compile(
+    r"\.(jpg|jpeg|png|webp|avif|gif|mp4|m3u8|mov|webm|js|css|map|json|html?|txt|xml)(?:$|\?)",
+    flags=re.I,
+)
+IMAGE_EXTS = frozenset(("jpg", "jpeg", "png", "webp", "avif", "gif"))
+VIDEO_EXTS = frozenset(("mp4", "m3u8", "mov", "webm"))
+STATIC_ASSET_EXTS = frozenset(("js", "css", "map", "json", "html", "htm", "txt", "xml"))
+# One "name=value" pair per match, whitespace trimmed; chunks without "=" or a name are skipped.
+COOKIE_PAIR_PATTERN = re.compile(r"(?:^|;)\s*([^=;\s][^=;]*?)\s*=\s*([^;]*?)\s*(?=;|$)")
+CANONICAL_GOODS_URL_PREFIX = "https://mobile.yangkeduo.com/goods.html?goods_id="
+GOODS_ID_QUERY_PATTERN = re.compile(r"[?&](?:goods_id|goodsId|gid)=(\d{5,})")
+GOODS_ID_FALLBACK_PATTERNS = (re.compile(r"goods_id=(\d{5,})"), re.compile(r"goods/(\d{5,})"))
+MEDIA_BODY_HINT_PATTERN = re.compile(rb"video|image|goods|mp4|m3u8", flags=re.I)
+# A JSON object key that names a media field at any depth, e.g. "goods_video", "thumb_url".
+MEDIA_KEY_PATTERN = re.compile(
+    rb'"[^"\\]{0,64}?(?:url|src|img|image|video|cover|thumb|pic|play|stream|hls)[^"\\]{0,64}?"\s*:',
+    flags=re.I,
+)
 VIDEO_HINTS = ("video", "play", "stream", "hls", "goods_video", "video_url")
 IMAGE_HINTS = ("image", "img", "cover", "thumb", "pic")
-STATIC_ASSET_EXT_PATTERN = re.compile(r"\.(?:js|css|map|json|html|htm|txt|xml)(?:$|\?)", flags=re.I)
+VIDEO_HINT_PATTERN = re.compile("|".join(map(re.escape, VIDEO_HINTS)), flags=re.I)
+IMAGE_HINT_PATTERN = re.compile("|".join(map(re.escape, IMAGE_HINTS)), flags=re.I)
+VIDEO_PATH_PATTERN = re.compile(r"/video|video-|/play|m3u8|mp4", flags=re.I)
+IMAGE_PATH_PATTERN = re.compile(r"/image|/img|cover|thumb|pic", flags=re.I)
+PLAYABLE_PATH_PATTERN = re.compile(r"/video|video-|/play", flags=re.I)
+PLAYABLE_URL_PATTERN = re.compile(r"m3u8|mp4|video", flags=re.I)
 BLOCKED_URL_KEYWORDS = (
     "down_download",
     "android_browser_download",
@@ -35,14 +74,55 @@ BLOCKED_URL_KEYWORDS = (
     "itunes.apple.com",
     "apps.apple.com",
 )
+BLOCKED_URL_PATTERN = re.compile("|".join(map(re.escape, BLOCKED_URL_KEYWORDS)), flags=re.I)
+META_KEYS = (
+    "og:title",
+    "og:image",
+    "og:video",
+    "og:video:url",
+    "twitter:title",
+    "twitter:image",
+    "twitter:player",
+)
+# property= matches are read before name= matches, so each key gets a pair of selectors.
+META_CSS_SELECTORS = {k: (f'meta[property="{k}"]', f'meta[name="{k}"]') for k in META_KEYS}
+META_PROP_ATTRS = {k: {"property": k} for k in META_KEYS}
+META_NAME_ATTRS = {k: {"name": k} for k in META_KEYS}
+# Larger XHR bodies only go through the bytes URL scan; parsing them would cost several times their size.
+MAX_JSON_PARSE_BYTES = 512 * 1024
 LOGIN_URL_KEYWORDS = ("login", "passport", "oauth", "verify", "sms")
 STORAGE_STATE_FILE = os.path.join(os.getcwd(), ".playwright_storage_state.json")
 PLAYWRIGHT_USER_DATA_DIR = os.path.join(os.getcwd(), ".playwright_user_data")
+AI_PREVIEW_MIN_INTERVAL_SECONDS = 0.1
+
+
+# Shared HTTP/2 keep-alive pool for static fetches; the share link and its canonical form usually hit
+# the same host. st.cache_resource keeps it across reruns, which re-execute this script from scratch.
+# httpx and Playwright are imported on first use so a cold Streamlit start only pays for the UI.
+@st.cache_resource(show_spinner=False)
+def get_http_transport() -> Any:
+    import httpx
+
+    return httpx.HTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=4, max_connections=8),
+    )
+
+
+@lru_cache(maxsize=1)
+def load_sync_playwright() -> Callable[[], Any]:
+    try:
+        from playwright.sync_api import sync_playwright
+    except Exception as exc:
+        raise RuntimeError("未安装 playwright，请先执行: playwright install chromium") from exc
+    return sync_playwright
 
 
+# Reruns start from a fresh module, so this cache only spans one run; the same URLs are checked
+# several times while a scrape picks its attempt list.
+@lru_cache(maxsize=512)
 def is_blocked_jump_url(url: str) -> bool:
-    low = url.lower()
-    return any(k in low for k in BLOCKED_URL_KEYWORDS)
+    return BLOCKED_URL_PATTERN.search(url) is not None
 
 
 def apply_anti_detection_scripts(context: Any) -> None:
@@ -66,6 +146,39 @@ def cleanup_stale_test_browsers() -> dict[str, Any]:
         "--remote-debugging-pipe",
         "--disable-blink-features=AutomationControlled",
     ]
+    try:
+        import psutil
+    except Exception:
+        return cleanup_stale_test_browsers_pkill(patterns)
+
+    # One pass over the process table instead of one pkill (fork+exec+scan) per pattern.
+    matched: dict[str, list[int]] = {pattern: [] for pattern in patterns}
+    own_pid = os.getpid()
+    for proc in psutil.process_iter(["pid", "cmdline"]):
+        pid = proc.info["pid"]
+        cmdline = proc.info.get("cmdline")
+        if pid == own_pid or not cmdline:
+            continue
+        cmd = " ".join(cmdline)
+        for pattern in patterns:
+            if pattern in cmd:
+                matched[pattern].append(pid)
+
+    errors: list[str] = []
+    pids = sorted({pid for pattern_pids in matched.values() for pid in pattern_pids})
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            continue
+        except Exception as exc:
+            errors.append(f"pid {pid}: {exc}")
+    matched_patterns = [pattern for pattern, pattern_pids in matched.items() if pattern_pids]
+    return {"matched_patterns": matched_patterns, "errors": errors, "pids": pids}
+
+
+def cleanup_stale_test_browsers_pkill(patterns: list[str]) -> dict[str, Any]:
+    # Fallback when psutil is not installed.
     matched_patterns: list[str] = []
     errors: list[str] = []
     for pattern in patterns:
@@ -106,10 +219,9 @@ class ProductInfo:
 
 
 def extract_url(text: str) -> str:
-    pattern = re.compile(r"(https?://[^\s]+)")
-    match = pattern.search(text.strip())
+    match = URL_PATTERN.search(text.strip())
     if match:
-        return match.group(1).strip("，。,.")
+        return TRAILING_PUNCT_PATTERN.sub("", match.group(0))
     return text.strip()
 
 
@@ -124,60 +236,62 @@ def normalize_url(raw: str) -> str:
 
 
 def extract_goods_id(url: str) -> str:
-    parsed = urlparse(url)
-    query = parse_qs(parsed.query)
-    for key in ("goods_id", "goodsId", "gid"):
-        if key in query and query[key]:
-            match = re.search(r"\d{5,}", str(query[key][0]))
-            if match:
-                return match.group(0)
-    for pattern in (r"goods_id=(\d{5,})", r"/goods/(\d{5,})", r"goods/(\d{5,})"):
-        match = re.search(pattern, url)
+    match = GOODS_ID_QUERY_PATTERN.search(url)
+    if match:
+        return match.group(1)
+    for pattern in GOODS_ID_FALLBACK_PATTERNS:
+        match = pattern.search(url)
         if match:
             return match.group(1)
     return ""
 
 
+# Called for the input link, the page URL and again inside parse_product_info within one run.
+@lru_cache(maxsize=512)
 def canonicalize_pdd_goods_url(url: str) -> str:
+    # Already canonical (prefix + bare numeric id): nothing to extract or rebuild.
+    if url.startswith(CANONICAL_GOODS_URL_PREFIX):
+        tail = url[len(CANONICAL_GOODS_URL_PREFIX):]
+        if len(tail) >= 5 and tail.isdigit():
+            return url
     goods_id = extract_goods_id(url)
     if not goods_id:
         return url
-    return f"https://mobile.yangkeduo.com/goods.html?goods_id={goods_id}"
+    return f"{CANONICAL_GOODS_URL_PREFIX}{goods_id}"
 
 
 def parse_cookie_header(cookie_text: str) -> dict[str, str]:
-    cookies: dict[str, str] = {}
-    if not cookie_text.strip():
-        return cookies
-    parts = cookie_text.split(";")
-    for part in parts:
-        if "=" not in part:
-            continue
-        k, v = part.split("=", 1)
-        key = k.strip()
-        val = v.strip()
-        if key:
-            cookies[key] = val
-    return cookies
+    return {m.group(1): m.group(2) for m in COOKIE_PAIR_PATTERN.finditer(cookie_text)}
 
 
 def fetch_html(url: str, cookie_text: str = "") -> tuple[str, str]:
-    headers = {"User-Agent": USER_AGENT}
-    if cookie_text.strip():
-        headers["Cookie"] = cookie_text.strip()
-    resp = requests.get(url, headers=headers, timeout=20, allow_redirects=True)
+    import httpx
+
+    headers = {"Cookie": cookie_text.strip()} if cookie_text.strip() else None
+    # A client per call gets its own cookie jar, so Set-Cookie from redirects applies within this
+    # chain only. It is left unclosed on purpose: closing a client also closes the shared transport.
+    client = httpx.Client(transport=get_http_transport(), timeout=20.0, headers={"User-Agent": USER_AGENT})
+    resp = client.get(url, headers=headers, follow_redirects=True)
     resp.raise_for_status()
-    return resp.text, resp.url
+    return resp.text, str(resp.url)
 
 
-def meta_values(soup: BeautifulSoup, keys: list[str]) -> list[str]:
+def meta_values(tree: Any, keys: list[str]) -> list[str]:
     values: list[str] = []
     for key in keys:
-        for tag in soup.find_all("meta", attrs={"property": key}):
+        if LexborHTMLParser is not None:
+            selectors = META_CSS_SELECTORS.get(key) or (f'meta[property="{key}"]', f'meta[name="{key}"]')
+            for selector in selectors:
+                for node in tree.css(selector):
+                    content = (node.attributes.get("content") or "").strip()
+                    if content:
+                        values.append(content)
+            continue
+        for tag in tree.find_all("meta", attrs=META_PROP_ATTRS.get(key) or {"property": key}):
             content = (tag.get("content") or "").strip()
             if content:
                 values.append(content)
-        for tag in soup.find_all("meta", attrs={"name": key}):
+        for tag in tree.find_all("meta", attrs=META_NAME_ATTRS.get(key) or {"name": key}):
             content = (tag.get("content") or "").strip()
             if content:
                 values.append(content)
@@ -190,48 +304,66 @@ def meta_values(soup: BeautifulSoup, keys: list[str]) -> list[str]:
     return uniq
 
 
-def uniq_by_path(items: list[str]) -> list[str]:
-    out: list[str] = []
-    seen = set()
+def path_key(url: str) -> str:
+    idx = url.find("?")
+    return url if idx < 0 else url[:idx]
+
+
+def uniq_by_path(items: Iterable[str]) -> list[str]:
+    out: dict[str, str] = {}
     for item in items:
-        normalized = item.split("?")[0]
-        if normalized not in seen:
-            seen.add(normalized)
-            out.append(item)
-    return out
+        out.setdefault(path_key(item), item)
+    return list(out.values())
 
 
-def classify_media_urls(candidates: list[str]) -> tuple[list[str], list[str]]:
+def media_exts(url: str) -> set[str]:
+    return {ext.lower() for ext in MEDIA_EXT_PATTERN.findall(url)}
+
+
+def classify_media_url(url: str) -> str:
+    exts = media_exts(url)
+    if exts & STATIC_ASSET_EXTS:
+        return ""
+    if exts & IMAGE_EXTS:
+        return "image"
+    if exts & VIDEO_EXTS:
+        return "video"
+
+    path = url_path(url)
+    # Avoid false positives like "svideo_index.js".
+    if VIDEO_HINT_PATTERN.search(url) and VIDEO_PATH_PATTERN.search(path):
+        return "video"
+    if IMAGE_HINT_PATTERN.search(url) and IMAGE_PATH_PATTERN.search(path):
+        return "image"
+    return ""
+
+
+def classify_and_dedupe(tagged: Iterable[tuple[str, str]]) -> tuple[list[str], list[str]]:
+    # Items are (kind, url); kind "image"/"video" is trusted, "" means classify by URL.
     images: list[str] = []
     videos: list[str] = []
-    for raw in candidates:
+    buckets = {"image": images, "video": videos}
+    # Dedupe per bucket: a video-frame poster shares its path with the video and must not hide it.
+    seen_paths: dict[str, set[str]] = {"image": set(), "video": set()}
+    for kind, raw in tagged:
         url = normalize_candidate_url(raw.strip())
         if not url.startswith("http"):
             continue
-        low = url.lower()
-        if STATIC_ASSET_EXT_PATTERN.search(low):
+        if not kind:
+            kind = classify_media_url(url)
+        bucket = buckets.get(kind)
+        if bucket is None:
+            continue
+        key = path_key(url)
+        if key in seen_paths[kind]:
             continue
+        seen_paths[kind].add(key)
+        bucket.append(url)
+    return images, videos
 
-        parsed = urlparse(url)
-        path = parsed.path.lower()
 
-        if IMAGE_EXT_PATTERN.search(low):
-            images.append(url)
-            continue
-        if VIDEO_EXT_PATTERN.search(low):
-            videos.append(url)
-            continue
-        # Avoid false positives like "svideo_index.js".
-        if any(h in low for h in VIDEO_HINTS) and any(
-            token in path for token in ("/video", "video-", "/play", "m3u8", "mp4")
-        ):
-            videos.append(url)
-            continue
-        if any(h in low for h in IMAGE_HINTS) and any(
-            token in path for token in ("/image", "/img", "cover", "thumb", "pic")
-        ):
-            images.append(url)
-    return uniq_by_path(images), uniq_by_path(videos)
+def classify_media_urls(candidates: list[str]) -> tuple[list[str], list[str]]:
+    return classify_and_dedupe(("", u) for u in candidates)
 
 
 def extract_urls_from_text(text: str) -> list[str]:
@@ -239,6 +371,45 @@ def extract_urls_from_text(text: str) -> list[str]:
     return URL_PATTERN.findall(normalized)
 
 
+def extract_urls_from_bytes(data: bytes, limit: int = 1000) -> list[str]:
+    # Bytes counterpart of extract_urls_from_text: scans the raw body without decoding it.
+    if b"\\/" in data or b"\\u002F" in data:
+        data = data.replace(b"\\u002F", b"/").replace(b"\\/", b"/")
+    urls: list[str] = []
+    for match in URL_BYTES_PATTERN.finditer(data):
+        urls.append(match.group(0).decode("utf-8", "ignore"))
+        if len(urls) >= limit:
+            break
+    return urls
+
+
+def url_path(url: str) -> str:
+    # Path-only slice of a URL; cheaper than a full urlparse in the classifier loops.
+    rest = url.split("://", 1)[-1]
+    end = len(rest)
+    for sep in ("?", "#"):
+        idx = rest.find(sep, 0, end)
+        if idx != -1:
+            end = idx
+    slash = rest.find("/", 0, end)
+    if slash == -1:
+        return ""
+    return rest[slash:end]
+
+
+def load_json(data: Union[bytes, str]) -> Any:
+    # orjson parses bytes directly and is several times faster than the stdlib on XHR bodies.
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump_json(obj: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False)
+
+
 def normalize_candidate_url(value: str) -> str:
     v = value.strip()
     if v.startswith("//"):
@@ -246,67 +417,122 @@ def normalize_candidate_url(value: str) -> str:
     return v
 
 
-def extract_media_from_json_obj(obj: Any, key_path: str = "") -> tuple[list[str], list[str]]:
-    images: list[str] = []
-    videos: list[str] = []
+def extract_media_from_json_obj(obj: Any) -> tuple[list[str], list[str]]:
+    # Ordered dicts keyed by the query-less URL dedupe as we go.
+    images: dict[str, str] = {}
+    videos: dict[str, str] = {}
+    stack: list[tuple[Any, tuple[str, ...]]] = [(obj, ())]
+    while stack:
+        node, path = stack.pop()
+        if isinstance(node, dict):
+            stack.extend((v, path + (str(k),)) for k, v in reversed(node.items()))
+            continue
+        if isinstance(node, list):
+            stack.extend((item, path) for item in reversed(node))
+            continue
+        if not isinstance(node, str):
+            continue
 
-    def classify_by_key(path: str, value: str) -> None:
-        low_path = path.lower()
-        url = normalize_candidate_url(value)
-        if not url.startswith("http"):
-            return
-        if any(h in low_path for h in VIDEO_HINTS):
-            videos.append(url)
-            return
-        if any(h in low_path for h in IMAGE_HINTS):
-            images.append(url)
-            return
-        classified_images, classified_videos = classify_media_urls([url])
-        images.extend(classified_images)
-        videos.extend(classified_videos)
-
-    if isinstance(obj, dict):
-        for k, v in obj.items():
-            next_path = f"{key_path}.{k}" if key_path else str(k)
-            sub_images, sub_videos = extract_media_from_json_obj(v, next_path)
-            images.extend(sub_images)
-            videos.extend(sub_videos)
-    elif isinstance(obj, list):
-        for idx, item in enumerate(obj):
-            next_path = f"{key_path}[{idx}]"
-            sub_images, sub_videos = extract_media_from_json_obj(item, next_path)
-            images.extend(sub_images)
-            videos.extend(sub_videos)
-    elif isinstance(obj, str):
-        classify_by_key(key_path, obj)
-        for url in extract_urls_from_text(obj):
-            classify_by_key(key_path, url)
-
-    return uniq_by_path(images), uniq_by_path(videos)
-
-
-def filter_valid_video_urls(urls: list[str]) -> list[str]:
+        value = node.strip()
+        if value.startswith("//"):
+            urls = [normalize_candidate_url(value)]
+        else:
+            if "\\" in value:
+                value = value.replace("\\u002F", "/").replace("\\/", "/")
+            urls = [m.group(0) for m in URL_PATTERN.finditer(value)]
+        if not urls:
+            continue
+
+        key_path = ".".join(path)
+        if VIDEO_HINT_PATTERN.search(key_path):
+            path_kind = "video"
+        elif IMAGE_HINT_PATTERN.search(key_path):
+            path_kind = "image"
+        else:
+            path_kind = ""
+        for url in urls:
+            kind = path_kind or classify_media_url(url)
+            if kind == "video":
+                videos.setdefault(path_key(url), url)
+            elif kind == "image":
+                images.setdefault(path_key(url), url)
+
+    return list(images.values()), list(videos.values())
+
+
+def is_playable_video_url(url: str) -> bool:
+    exts = media_exts(url)
+    if exts & STATIC_ASSET_EXTS:
+        return False
+    if exts & VIDEO_EXTS:
+        return True
+    return bool(PLAYABLE_PATH_PATTERN.search(url_path(url)) and PLAYABLE_URL_PATTERN.search(url))
+
+
+def filter_valid_video_urls(urls: Iterable[str], limit: Optional[int] = None) -> list[str]:
+    # Single pass: validate, dedupe by path and stop at limit.
     valid: list[str] = []
+    seen_paths: set[str] = set()
     for raw in urls:
         url = normalize_candidate_url(raw.strip())
         if not url.startswith("http"):
             continue
-        low = url.lower()
-        if STATIC_ASSET_EXT_PATTERN.search(low):
-            continue
-        if VIDEO_EXT_PATTERN.search(low):
-            valid.append(url)
+        key = path_key(url)
+        if key in seen_paths or not is_playable_video_url(url):
             continue
-        parsed = urlparse(url)
-        path = parsed.path.lower()
-        if any(token in path for token in ("/video", "video-", "/play")) and any(
-            token in low for token in ("m3u8", "mp4", "video")
-        ):
-            valid.append(url)
-    return uniq_by_path(valid)
+        seen_paths.add(key)
+        valid.append(url)
+        if limit is not None and len(valid) >= limit:
+            break
+    return valid
 
 
 def extract_from_html(html: str) -> tuple[str, list[str], list[str]]:
+    # One scan of the raw markup covers inline scripts, JSON blobs and data attributes;
+    # the DOM is only needed for title/meta/img/video.
+    raw_images, raw_videos = classify_media_urls(extract_urls_from_text(html))
+    if LexborHTMLParser is None:
+        title, images, videos = extract_dom_media_bs4(html)
+    else:
+        title, images, videos = extract_dom_media(html)
+    return title, uniq_by_path(chain(images, raw_images)), uniq_by_path(chain(videos, raw_videos))
+
+
+def extract_dom_media(html: str) -> tuple[str, list[str], list[str]]:
+    tree = LexborHTMLParser(html)
+
+    title = ""
+    title_candidates = meta_values(tree, ["og:title", "twitter:title"])
+    if title_candidates:
+        title = title_candidates[0]
+    else:
+        title_node = tree.css_first("title")
+        if title_node is not None:
+            title = title_node.text().strip()
+
+    image_candidates = meta_values(tree, ["og:image", "twitter:image"])
+    video_candidates = meta_values(tree, ["og:video", "og:video:url", "twitter:player"])
+
+    for img in tree.css("img"):
+        attrs = img.attributes
+        src = normalize_candidate_url(
+            (attrs.get("src") or attrs.get("data-src") or attrs.get("data-original") or "").strip()
+        )
+        if src.startswith("http"):
+            image_candidates.append(src)
+    for video in tree.css("video"):
+        src = normalize_candidate_url((video.attributes.get("src") or "").strip())
+        if src.startswith("http"):
+            video_candidates.append(src)
+    for source in tree.css("video source"):
+        source_src = normalize_candidate_url((source.attributes.get("src") or "").strip())
+        if source_src.startswith("http"):
+            video_candidates.append(source_src)
+    return title, image_candidates, video_candidates
+
+
+def extract_dom_media_bs4(html: str) -> tuple[str, list[str], list[str]]:
+    # Fallback when selectolax is not installed.
     soup = BeautifulSoup(html, "lxml")
 
     title = ""
@@ -331,23 +557,16 @@ def extract_from_html(html: str) -> tuple[str, list[str], list[str]]:
             source_src = normalize_candidate_url((source.get("src") or "").strip())
             if source_src.startswith("http"):
                 video_candidates.append(source_src)
-
-    script_text = " ".join(script.get_text(" ", strip=True) for script in soup.find_all("script"))
-    script_urls = extract_urls_from_text(script_text)
-    classified_images, classified_videos = classify_media_urls(script_urls)
-    image_candidates.extend(classified_images)
-    video_candidates.extend(classified_videos)
-    return title, uniq_by_path(image_candidates), uniq_by_path(video_candidates)
+    return title, image_candidates, video_candidates
 
 
 def parse_static(source_url: str, cookie_text: str = "") -> ProductInfo:
     info = ProductInfo(source_url=source_url)
     html, final_url = fetch_html(source_url, cookie_text=cookie_text)
     info.final_url = final_url
-    title, images, videos = extract_from_html(html)
+    # extract_from_html already dedupes by path.
+    title, all_images, all_videos = extract_from_html(html)
     info.title = title
-    all_images = uniq_by_path(images)
-    all_videos = uniq_by_path(videos)
     info.images = all_images[:6]
     info.videos = all_videos[:3]
     info.raw = {
@@ -359,11 +578,76 @@ def parse_static(source_url: str, cookie_text: str = "") -> ProductInfo:
     return info
 
 
+def launch_headless_browser() -> tuple[Any, Any]:
+    headless = os.getenv("PLAYWRIGHT_HEADLESS", "1").strip().lower() not in {"0", "false", "no"}
+    pw = load_sync_playwright()().start()
+    try:
+        browser = pw.chromium.launch(
+            headless=headless,
+            args=[
+                "--disable-blink-features=AutomationControlled",
+                "--no-first-run",
+                "--no-default-browser-check",
+            ],
+        )
+    except Exception:
+        pw.stop()
+        raise
+    return pw, browser
+
+
+def close_headless_browser(pw: Any, browser: Any) -> None:
+    try:
+        browser.close()
+    except Exception:
+        pass
+    try:
+        pw.stop()
+    except Exception:
+        pass
+
+
 def parse_dynamic_with_playwright(
     source_url: str,
     cookie_text: str = "",
     live_page: Optional[Any] = None,
 ) -> ProductInfo:
+    if live_page is None:
+        # Standalone headless scrape; the app itself reuses the login browser kept in session_state.
+        pw, browser = launch_headless_browser()
+        try:
+            return scrape_with_headless_browser(browser, source_url)
+        finally:
+            close_headless_browser(pw, browser)
+
+    # If we already have a logged-in live page with visible content, avoid extra navigation.
+    try:
+        use_current_page_first = not page_looks_logged_out(live_page)
+    except Exception:
+        use_current_page_first = False
+    return scrape_dynamic_page(live_page, source_url, navigate=not use_current_page_first)
+
+
+def scrape_with_headless_browser(browser: Any, source_url: str) -> ProductInfo:
+    context_kwargs: dict[str, Any] = {
+        "user_agent": DESKTOP_USER_AGENT,
+        "viewport": {"width": 1280, "height": 900},
+        "locale": "zh-CN",
+    }
+    if os.path.exists(STORAGE_STATE_FILE):
+        context_kwargs["storage_state"] = STORAGE_STATE_FILE
+    context = browser.new_context(**context_kwargs)
+    apply_anti_detection_scripts(context)
+    try:
+        return scrape_dynamic_page(context.new_page(), source_url, navigate=True)
+    finally:
+        try:
+            context.close()
+        except Exception:
+            pass
+
+
+def scrape_dynamic_page(page: Any, source_url: str, navigate: bool) -> ProductInfo:
     info = ProductInfo(source_url=source_url)
 
     network_urls: list[str] = []
@@ -371,36 +655,7 @@ def parse_dynamic_with_playwright(
     json_urls: list[str] = []
     json_images: list[str] = []
     json_videos: list[str] = []
-    should_close = False
-    if live_page is not None:
-        page = live_page
-    else:
-        try:
-            from playwright.sync_api import sync_playwright
-        except Exception as exc:
-            raise RuntimeError("未安装 playwright，请先执行: playwright install chromium") from exc
-        headless = os.getenv("PLAYWRIGHT_HEADLESS", "1").strip().lower() not in {"0", "false", "no"}
-        p = sync_playwright().start()
-        browser = p.chromium.launch(
-            headless=headless,
-            args=[
-                "--disable-blink-features=AutomationControlled",
-                "--no-first-run",
-                "--no-default-browser-check",
-            ],
-        )
-        context_kwargs: dict[str, Any] = {
-            "user_agent": DESKTOP_USER_AGENT,
-            "viewport": {"width": 1280, "height": 900},
-            "locale": "zh-CN",
-        }
-        if os.path.exists(STORAGE_STATE_FILE):
-            context_kwargs["storage_state"] = STORAGE_STATE_FILE
-        context = browser.new_context(**context_kwargs)
-        apply_anti_detection_scripts(context)
-        page = context.new_page()
-        should_close = True
-
+    in_flight: set[Any] = set()
     context = page.context
 
     def safe_goto(target_url: str) -> None:
@@ -409,10 +664,14 @@ def parse_dynamic_with_playwright(
             page.goto(source_url, wait_until="domcontentloaded", timeout=45000)
 
     def on_request(request: Any) -> None:
+        in_flight.add(request)
         req_url = request.url
         if req_url.startswith("http"):
             network_urls.append(req_url)
 
+    def on_request_done(request: Any) -> None:
+        in_flight.discard(request)
+
     def on_response(response: Any) -> None:
         res_url = response.url
         if res_url.startswith("http"):
@@ -424,23 +683,49 @@ def parse_dynamic_with_playwright(
         if len(json_urls) >= 80:
             return
         try:
-            body = response.text()
+            body_bytes = response.body()
         except Exception:
             return
-        if "http" not in body:
+        if b"http" not in body_bytes:
+            return
+        if not MEDIA_BODY_HINT_PATTERN.search(body_bytes):
+            return
+        # body() must stay on the Playwright thread; decoding and walking the payload do not.
+        body_worker.submit(process_body, body_bytes)
+
+    def process_body(body_bytes: bytes) -> None:
+        json_urls.extend(extract_urls_from_bytes(body_bytes))
+        if len(body_bytes) > MAX_JSON_PARSE_BYTES:
             return
-        body_low = body.lower()
-        if not any(k in body_low for k in ("video", "image", "goods", "mp4", "m3u8")):
+        # json_urls already covers absolute URLs, so walk only when a media-looking key or a
+        # protocol-relative string value ("//...", which the bytes scan cannot see) is present.
+        if b'"//' not in body_bytes and not MEDIA_KEY_PATTERN.search(body_bytes):
             return
-        json_urls.extend(extract_urls_from_text(body))
         try:
-            payload = json.loads(body)
+            payload = load_json(body_bytes)
         except Exception:
             return
         extracted_images, extracted_videos = extract_media_from_json_obj(payload)
         json_images.extend(extracted_images)
         json_videos.extend(extracted_videos)
 
+    def wait_for_network_quiet(quiet_ms: int = 600, max_ms: int = 2500) -> None:
+        # Event-driven replacement for fixed sleeps: listeners keep firing during wait_for_timeout.
+        # A step only counts as quiet when no request started and none is still awaiting its
+        # response, so late XHRs (where video URLs usually arrive) reach on_response first.
+        step_ms = 200
+        waited = 0
+        quiet = 0
+        seen = len(network_urls)
+        while waited < max_ms and quiet < quiet_ms:
+            page.wait_for_timeout(step_ms)
+            waited += step_ms
+            if len(network_urls) == seen and not in_flight:
+                quiet += step_ms
+            else:
+                seen = len(network_urls)
+                quiet = 0
+
     def on_popup(popup: Any) -> None:
         # Some pages open login windows during click simulation; keep extraction on the main page.
         try:
@@ -456,7 +741,11 @@ def parse_dynamic_with_playwright(
         except Exception:
             pass
 
+    # A single worker keeps JSON results in response order.
+    body_worker = ThreadPoolExecutor(max_workers=1)
     page.on("request", on_request)
+    page.on("requestfinished", on_request_done)
+    page.on("requestfailed", on_request_done)
     page.on("response", on_response)
     page.on("popup", on_popup)
     context.on("page", on_context_page)
@@ -464,30 +753,22 @@ def parse_dynamic_with_playwright(
     html = ""
     page_assets: dict[str, list[str]] = {"imgs": [], "videos": [], "links": []}
     try:
-        # If we already have a logged-in live page with visible content, avoid extra navigation.
-        use_current_page_first = False
-        if live_page is not None:
-            try:
-                use_current_page_first = not page_looks_logged_out(page)
-            except Exception:
-                use_current_page_first = False
-
-        if not use_current_page_first:
+        if navigate:
             safe_goto(source_url)
 
         try:
             page.wait_for_load_state("networkidle", timeout=8000)
         except Exception:
             pass
-        page.wait_for_timeout(2500)
+        wait_for_network_quiet()
 
-        # 触发首屏后的懒加载素材
+        # 触发首屏后的懒加载素材：连续滚动，懒加载请求与滚动重叠，再等网络安静
         page.mouse.wheel(0, 1800)
-        page.wait_for_timeout(1200)
+        page.wait_for_timeout(300)
         page.mouse.wheel(0, -800)
-        page.wait_for_timeout(500)
+        page.wait_for_timeout(300)
         page.mouse.wheel(0, 2200)
-        page.wait_for_timeout(800)
+        wait_for_network_quiet()
 
         # Optional aggressive click probing. Disabled by default to avoid opening login popups.
         click_probe_enabled = os.getenv("PLAYWRIGHT_CLICK_PROBE", "0").strip().lower() in {"1", "true", "yes"}
@@ -502,10 +783,10 @@ def parse_dynamic_with_playwright(
                     pass
 
         final_url = page.url
-        html = page.content()
-
-        page_assets = page.evaluate(
+        # One round-trip returns the serialized DOM together with the rendered media sources.
+        page_state = page.evaluate(
             """() => {
+                const html = document.documentElement ? document.documentElement.outerHTML : "";
                 const imgs = Array.from(document.querySelectorAll("img"))
                   .map(n => n.currentSrc || n.src || n.getAttribute("data-src") || "")
                   .filter(Boolean);
@@ -515,12 +796,16 @@ def parse_dynamic_with_playwright(
                 const links = Array.from(document.querySelectorAll("source"))
                   .map(n => n.src || "")
                   .filter(Boolean);
-                return { imgs, videos, links };
+                return { html, imgs, videos, links };
             }"""
         )
+        html = page_state.get("html") or ""
+        page_assets = {k: page_state.get(k) or [] for k in ("imgs", "videos", "links")}
     finally:
         try:
             page.remove_listener("request", on_request)
+            page.remove_listener("requestfinished", on_request_done)
+            page.remove_listener("requestfailed", on_request_done)
             page.remove_listener("response", on_response)
             page.remove_listener("popup", on_popup)
         except Exception:
@@ -529,31 +814,26 @@ def parse_dynamic_with_playwright(
             context.remove_listener("page", on_context_page)
         except Exception:
             pass
-    if should_close:
-        try:
-            page.context.close()
-        except Exception:
-            pass
-        try:
-            p.stop()
-        except Exception:
-            pass
+        body_worker.shutdown(wait=True)
 
-    title, images, videos = extract_from_html(html)
-    images.extend(page_assets.get("imgs", []))
-    videos.extend(page_assets.get("videos", []))
-    videos.extend(page_assets.get("links", []))
-    images.extend(json_images)
-    videos.extend(json_videos)
+    title, html_images, html_videos = extract_from_html(html)
     all_network = network_urls + response_urls + json_urls
-    net_images, net_videos = classify_media_urls(all_network)
-    images.extend(net_images)
-    videos.extend(net_videos)
+    # Single pass over every source; known-kind sources keep their bucket, network URLs are classified.
+    all_images, all_videos = classify_and_dedupe(
+        chain(
+            (("image", u) for u in html_images),
+            (("video", u) for u in html_videos),
+            (("image", u) for u in page_assets.get("imgs", [])),
+            (("video", u) for u in page_assets.get("videos", [])),
+            (("video", u) for u in page_assets.get("links", [])),
+            (("image", u) for u in json_images),
+            (("video", u) for u in json_videos),
+            (("", u) for u in all_network),
+        )
+    )
 
     info.final_url = final_url
     info.title = title
-    all_images = uniq_by_path(images)
-    all_videos = uniq_by_path(videos)
     info.images = all_images[:6]
     info.videos = all_videos[:3]
     info.raw = {
@@ -580,17 +860,17 @@ def merge_info(base: ProductInfo, incoming: ProductInfo, source_label: str) -> N
     if incoming.final_url:
         base.final_url = incoming.final_url
 
-    merged_images = uniq_by_path(base.images + incoming.images)
-    merged_videos = uniq_by_path(base.videos + incoming.videos)
+    merged_images = uniq_by_path(chain(base.images, incoming.images))
+    merged_videos = uniq_by_path(chain(base.videos, incoming.videos))
     base.images = merged_images[:6]
     base.videos = merged_videos[:3]
 
     base_video_candidates = base.raw.get("video_candidates", [])
     incoming_video_candidates = incoming.raw.get("video_candidates", [])
-    base.raw["video_candidates"] = uniq_by_path(base_video_candidates + incoming_video_candidates)[:12]
+    base.raw["video_candidates"] = uniq_by_path(chain(base_video_candidates, incoming_video_candidates))[:12]
     base_image_candidates = base.raw.get("image_candidates", [])
     incoming_image_candidates = incoming.raw.get("image_candidates", [])
-    base.raw["image_candidates"] = uniq_by_path(base_image_candidates + incoming_image_candidates)[:12]
+    base.raw["image_candidates"] = uniq_by_path(chain(base_image_candidates, incoming_image_candidates))[:12]
 
     attempts = base.raw.get("merge_from", [])
     attempts.append(source_label)
@@ -598,12 +878,7 @@ def merge_info(base: ProductInfo, incoming: ProductInfo, source_label: str) -> N
 
 
 def ensure_login_browser_session() -> dict[str, Any]:
-    try:
-        from playwright.sync_api import sync_playwright
-    except Exception as exc:
-        raise RuntimeError("未安装 playwright，请先执行: playwright install chromium") from exc
-
-    pw = sync_playwright().start()
+    pw = load_sync_playwright()().start()
     browser = None
     context = None
     os.makedirs(PLAYWRIGHT_USER_DATA_DIR, exist_ok=True)
@@ -646,10 +921,24 @@ def ensure_login_browser_session() -> dict[str, Any]:
         except Exception:
             pass
 
+    session: dict[str, Any] = {"pw": pw, "browser": browser, "context": context, "page_count": 0}
+
+    # Track open pages from context events so main can skip close_extra_pages' IPC sweep.
+    def on_page_close(_closed: Any) -> None:
+        session["page_count"] = max(0, session["page_count"] - 1)
+
+    def on_page_open(new_page: Any) -> None:
+        session["page_count"] += 1
+        new_page.on("close", on_page_close)
+
+    for existing in context.pages:
+        on_page_open(existing)
+    context.on("page", on_page_open)
+
     page = context.pages[0] if context.pages else context.new_page()
     page.on("dialog", on_dialog)
-
-    return {"pw": pw, "browser": browser, "context": context, "page": page}
+    session["page"] = page
+    return session
 
 
 def close_login_browser_session(session: dict[str, Any]) -> None:
@@ -675,6 +964,14 @@ def close_login_browser_session(session: dict[str, Any]) -> None:
     # Do not force-kill browser processes here; graceful close avoids "restore pages" prompts.
 
 
+def maybe_save_storage_state(context: Any) -> None:
+    # Best-effort: a closed or crashed context must not break the run.
+    try:
+        context.storage_state(path=STORAGE_STATE_FILE)
+    except Exception:
+        pass
+
+
 def browser_session_alive(session: Optional[dict[str, Any]]) -> bool:
     if not session:
         return False
@@ -783,8 +1080,7 @@ def page_looks_logged_out(page: Any) -> bool:
     except Exception:
         return True
 
-    parsed = urlparse(current_url)
-    path = parsed.path or ""
+    path = url_path(current_url)
 
     # If the page already renders media/content, treat it as ready even if query contains "login".
     try:
@@ -847,12 +1143,15 @@ def parse_product_info(
 
     static_infos: list[ProductInfo] = []
     static_errors: list[str] = []
-    for u in candidate_urls:
-        try:
-            static_info = parse_static(u, cookie_text=cookie_text)
-            static_infos.append(static_info)
-        except Exception as exc:
-            static_errors.append(f"{u} -> {exc}")
+    # Candidates are independent network round-trips; fetch them concurrently but keep
+    # results in candidate order so score ties still prefer the original link.
+    with ThreadPoolExecutor(max_workers=len(candidate_urls)) as executor:
+        futures = [(u, executor.submit(parse_static, u, cookie_text)) for u in candidate_urls]
+        for u, future in futures:
+            try:
+                static_infos.append(future.result())
+            except Exception as exc:
+                static_errors.append(f"{u} -> {exc}")
 
     if not static_infos:
         raise RuntimeError("静态抓取全部失败: " + " | ".join(static_errors))
@@ -873,8 +1172,9 @@ def parse_product_info(
     if static_errors:
         info.raw["static_errors"] = static_errors
 
-    need_dynamic = (not info.title) or (len(info.images) < 1) or (len(info.videos) < 1)
-    if not need_dynamic:
+    # Skip Playwright entirely when the static pass already has everything.
+    has_title, has_image, has_video = bool(info.title), bool(info.images), bool(info.videos)
+    if has_title and has_image and has_video:
         return info
 
     dynamic_attempt_urls: list[str] = []
@@ -883,11 +1183,17 @@ def parse_product_info(
         dynamic_attempt_urls.append(first_try_url)
     else:
         dynamic_attempt_urls.append(source_url)
+    seen_attempt_urls = set(dynamic_attempt_urls)
     for u in candidate_urls:
-        if u not in dynamic_attempt_urls and not is_blocked_jump_url(u):
-            dynamic_attempt_urls.append(u)
+        if u in seen_attempt_urls or is_blocked_jump_url(u):
+            continue
+        seen_attempt_urls.add(u)
+        dynamic_attempt_urls.append(u)
 
     dynamic_logs: list[str] = []
+    net_max = int(info.raw.get("network_urls_count", 0))
+    json_max = int(info.raw.get("json_video_candidates", 0))
+    dynamic_ok = False
     for idx, u in enumerate(dynamic_attempt_urls):
         try:
             dynamic_info = parse_dynamic_with_playwright(
@@ -896,97 +1202,181 @@ def parse_product_info(
                 live_page=live_page,
             )
             merge_info(info, dynamic_info, source_label=f"dynamic_{idx}:{u}")
-            info.raw["network_urls_count"] = max(
-                int(info.raw.get("network_urls_count", 0)),
-                int(dynamic_info.raw.get("network_urls_count", 0)),
-            )
-            info.raw["json_video_candidates"] = max(
-                int(info.raw.get("json_video_candidates", 0)),
-                int(dynamic_info.raw.get("json_video_candidates", 0)),
-            )
+            net_max = max(net_max, int(dynamic_info.raw.get("network_urls_count", 0)))
+            json_max = max(json_max, int(dynamic_info.raw.get("json_video_candidates", 0)))
+            dynamic_ok = True
             dynamic_logs.append(f"{u} -> ok")
-            info.raw["fallback"] = "playwright"
-            info.raw["method"] = "hybrid(static+playwright)"
-            if info.videos:
+            has_title = has_title or bool(info.title)
+            has_image = has_image or bool(info.images)
+            has_video = has_video or bool(info.videos)
+            if has_title and has_image and has_video:
                 break
         except Exception as exc:
-            dynamic_logs.append(f"{u} -> failed: {exc}")
+            dynamic_logs.append(f"{u} -> failed: {exc!r}")
 
     if dynamic_logs:
         info.raw["dynamic_attempts"] = dynamic_logs
-    if "fallback" not in info.raw and dynamic_logs:
-        info.raw["fallback"] = "playwright_failed: " + " | ".join(dynamic_logs)
+    if dynamic_ok:
+        info.raw["fallback"] = "playwright"
+        info.raw["method"] = "hybrid(static+playwright)"
+        info.raw["network_urls_count"] = net_max
+        info.raw["json_video_candidates"] = json_max
+    elif dynamic_logs:
+        info.raw["fallback"] = "playwright_failed: %s" % " | ".join(dynamic_logs)
+
+    # Confirmed videos lead the chain, so the first three valid entries are the ones to show.
+    valid_videos = filter_valid_video_urls(chain(info.videos, info.raw.get("video_candidates", [])), limit=12)
+    info.videos = valid_videos[:3]
+    info.raw["video_candidates"] = valid_videos
+
+    return info
 
-    info.videos = filter_valid_video_urls(info.videos)[:3]
-    info.raw["video_candidates"] = filter_valid_video_urls(info.raw.get("video_candidates", []))[:12]
 
+class IncompleteScrapeError(Exception):
+    # Carries a usable but partial result out of the cached wrapper; st.cache_data never stores exceptions.
+    def __init__(self, info: ProductInfo) -> None:
+        super().__init__("incomplete scrape result")
+        self.info = info
+
+
+# Repeat clicks on the same product reuse the last complete scrape for 10 minutes. Only the canonical
+# input URL and a cookie fingerprint form the key; underscore arguments are skipped by Streamlit's hasher.
+# Results without videos or with a failed dynamic pass are returned but not cached, so a retry after
+# logging in scrapes again.
+@st.cache_data(ttl=600, show_spinner=False)
+def cached_parse_product_info(
+    canonical_url: str,
+    cookie_hash: str,
+    _source_url: str,
+    _cookie_text: str = "",
+    _live_page: Optional[Any] = None,
+) -> ProductInfo:
+    info = parse_product_info(_source_url, cookie_text=_cookie_text, live_page=_live_page)
+    if not info.videos or str(info.raw.get("fallback", "")).startswith("playwright_failed"):
+        raise IncompleteScrapeError(info)
     return info
 
 
+def cookie_fingerprint(cookie_text: str) -> str:
+    return hashlib.blake2b(cookie_text.strip().encode(), digest_size=8).hexdigest()
+
+
+# Only the title varies, so the fallback copy is three %-templates filled in per call.
+FALLBACK_POINTS_TEMPLATE = (
+    "1) 用户关注点：%s是否真有性价比。\n"
+    "2) 核心卖点：价格门槛低、下单链路短、适合快速决策。\n"
+    "3) 下单触发：限时、限量、真实使用场景。"
+)
+FALLBACK_SCRIPT_TEMPLATE = (
+    "开场3秒：今天测一个爆款，名字叫《%s》。\n"
+    "中段15秒：我先说结论，它最大的优势是入手门槛低，功能覆盖常见需求。"
+    "如果你跟我一样追求省钱省事，这个配置已经够用。\n"
+    "收尾12秒：适合学生党、租房党、和第一次尝试的人群。"
+    "想要链接我放在评论区，先领券再下单。"
+)
+FALLBACK_XHS_TEMPLATE = (
+    "标题建议：挖到宝了｜%s值不值？\n"
+    "正文建议：\n"
+    "最近在做平价好物测评，这个我实际看下来有3个优点：\n"
+    "1. 预算友好\n2. 使用门槛低\n3. 日常场景覆盖广\n"
+    "不夸张不踩雷，建议先领券再决定。"
+)
+
+
 def fallback_copy(info: ProductInfo) -> dict[str, str]:
     title = info.title or "该商品"
-    points = (
-        f"1) 用户关注点：{title}是否真有性价比。\n"
-        "2) 核心卖点：价格门槛低、下单链路短、适合快速决策。\n"
-        "3) 下单触发：限时、限量、真实使用场景。"
-    )
-    script = (
-        f"开场3秒：今天测一个爆款，名字叫《{title}》。\n"
-        "中段15秒：我先说结论，它最大的优势是入手门槛低，功能覆盖常见需求。"
-        "如果你跟我一样追求省钱省事，这个配置已经够用。\n"
-        "收尾12秒：适合学生党、租房党、和第一次尝试的人群。"
-        "想要链接我放在评论区，先领券再下单。"
-    )
-    xhs = (
-        f"标题建议：挖到宝了｜{title}值不值？\n"
-        "正文建议：\n"
-        "最近在做平价好物测评，这个我实际看下来有3个优点：\n"
-        "1. 预算友好\n2. 使用门槛低\n3. 日常场景覆盖广\n"
-        "不夸张不踩雷，建议先领券再决定。"
+    return {
+        "selling_points": FALLBACK_POINTS_TEMPLATE % title,
+        "script_30s": FALLBACK_SCRIPT_TEMPLATE % title,
+        "xhs_rewrite": FALLBACK_XHS_TEMPLATE % title,
+    }
+
+
+AI_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "你是电商内容策略师。请根据商品信息输出JSON，字段固定为"
+        "selling_points, script_30s, xhs_rewrite。内容使用简体中文。"
+    ),
+}
+AI_COPY_GOALS = [
+    "卖点拆解（3-5条）",
+    "30秒带货脚本（分段）",
+    "小红书版本改写（标题+正文）",
+]
+# The goal list never changes, so its JSON is serialized once and appended to each prompt.
+AI_PROMPT_SUFFIX = ',"goal":' + dump_json(AI_COPY_GOALS) + "}"
+
+
+def build_ai_prompt(info: ProductInfo) -> str:
+    return "".join(
+        (
+            '{"title":',
+            dump_json(info.title),
+            ',"images":',
+            dump_json(info.images),
+            ',"videos":',
+            dump_json(info.videos),
+            AI_PROMPT_SUFFIX,
+        )
     )
-    return {"selling_points": points, "script_30s": script, "xhs_rewrite": xhs}
 
 
-def generate_ai_copy(info: ProductInfo) -> dict[str, str]:
+# One client per key keeps its HTTP connection pool warm; st.cache_resource holds it across reruns.
+@st.cache_resource(show_spinner=False)
+def get_openai_client(api_key: str) -> Optional[Any]:
+    try:
+        from openai import OpenAI
+    except Exception:
+        return None
+    return OpenAI(api_key=api_key)
+
+
+def generate_ai_copy(
+    info: ProductInfo,
+    on_progress: Optional[Callable[[str], None]] = None,
+) -> dict[str, str]:
     api_key = os.getenv("OPENAI_API_KEY", "").strip()
     if not api_key:
         return fallback_copy(info)
 
-    try:
-        from openai import OpenAI
-    except Exception:
+    client = get_openai_client(api_key)
+    if client is None:
         return fallback_copy(info)
 
     model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-    client = OpenAI(api_key=api_key)
-    prompt = {
-        "title": info.title,
-        "images": info.images,
-        "videos": info.videos,
-        "goal": [
-            "卖点拆解（3-5条）",
-            "30秒带货脚本（分段）",
-            "小红书版本改写（标题+正文）",
-        ],
-    }
-    resp = client.chat.completions.create(
+    # Stream so the UI can show partial output instead of waiting for the whole completion.
+    stream = client.chat.completions.create(
         model=model,
         temperature=0.7,
+        stream=True,
         response_format={"type": "json_object"},
         messages=[
-            {
-                "role": "system",
-                "content": (
-                    "你是电商内容策略师。请根据商品信息输出JSON，字段固定为"
-                    "selling_points, script_30s, xhs_rewrite。内容使用简体中文。"
-                ),
-            },
-            {"role": "user", "content": json.dumps(prompt, ensure_ascii=False)},
+            AI_SYSTEM_MESSAGE,
+            {"role": "user", "content": build_ai_prompt(info)},
         ],
     )
-    content = resp.choices[0].message.content or "{}"
-    data = json.loads(content)
-    if not all(key in data for key in ["selling_points", "script_30s", "xhs_rewrite"]):
+    content = ""
+    last_preview_at = 0.0
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
+        content += delta
+        # Each preview is a frontend message, so send at most one per interval rather than per token.
+        if on_progress is not None:
+            now = time.monotonic()
+            if now - last_preview_at >= AI_PREVIEW_MIN_INTERVAL_SECONDS:
+                last_preview_at = now
+                on_progress(content)
+    content = content or "{}"
+    try:
+        data = load_json(content)
+    except ValueError:
+        return fallback_copy(info)
+    if not isinstance(data, dict) or not all(key in data for key in ["selling_points", "script_30s", "xhs_rewrite"]):
         return fallback_copy(info)
     return {
         "selling_points": str(data["selling_points"]),
@@ -995,6 +1385,17 @@ def generate_ai_copy(info: ProductInfo) -> dict[str, str]:
     }
 
 
+LOGIN_ON_STYLE = "background:#e8f7ee;color:#0f6b38;border:1px solid #a7dfbe;"
+LOGIN_OFF_STYLE = "background:#fff3e8;color:#9c4b00;border:1px solid #ffc999;"
+LOGIN_STATE_HTML_TEMPLATE = (
+    "<div style='margin-top:4px;padding:6px 10px;border-radius:8px;"
+    "font-weight:600;display:inline-block;{style}'>"
+    "当前状态：{state}</div>"
+)
+LOGIN_ON_HTML = LOGIN_STATE_HTML_TEMPLATE.format(style=LOGIN_ON_STYLE, state="已点开（已确认登录）")
+LOGIN_OFF_HTML = LOGIN_STATE_HTML_TEMPLATE.format(style=LOGIN_OFF_STYLE, state="未点开（未确认登录）")
+
+
 def main() -> None:
     st.set_page_config(page_title="PDD 内容生成 MVP", page_icon="🛍️", layout="wide")
     st.title("拼多多商品内容生成 MVP")
@@ -1008,6 +1409,9 @@ def main() -> None:
         if key_input != admin_key:
             st.warning("管理员口令错误，已切换为用户视图。")
             is_admin = False
+    if is_admin and st.sidebar.button("清空抓取结果缓存"):
+        cached_parse_product_info.clear()
+        st.sidebar.success("已清空抓取结果缓存。")
 
     raw_input = st.text_area(
         "商品链接（可粘贴微信分享文本）",
@@ -1025,7 +1429,7 @@ def main() -> None:
     if "browser_session" not in st.session_state:
         st.session_state["browser_session"] = None
 
-    action_col, login_col, close_col, cleanup_col, force_cleanup_col = st.columns([1, 1, 1, 1, 1])
+    action_col, login_col = st.columns(2)
     with action_col:
         run = st.button("开始生成", type="primary")
     with login_col:
@@ -1035,26 +1439,13 @@ def main() -> None:
             key="login_confirmed_toggle",
             help="点开=已确认登录；关闭=未确认登录。",
         )
-        login_state_text = "已点开（已确认登录）" if login_confirmed else "未点开（未确认登录）"
-        login_state_style = (
-            "background:#e8f7ee;color:#0f6b38;border:1px solid #a7dfbe;"
-            if login_confirmed
-            else "background:#fff3e8;color:#9c4b00;border:1px solid #ffc999;"
-        )
-        st.markdown(
-            (
-                "<div style='margin-top:4px;padding:6px 10px;border-radius:8px;"
-                f"font-weight:600;display:inline-block;{login_state_style}'>"
-                f"当前状态：{login_state_text}</div>"
-            ),
-            unsafe_allow_html=True,
-        )
+        st.markdown(LOGIN_ON_HTML if login_confirmed else LOGIN_OFF_HTML, unsafe_allow_html=True)
         st.caption("勾选后请再点击“开始生成”以继续采集。")
-    with close_col:
-        close_browser = st.button("关闭登录浏览器")
-    with cleanup_col:
-        cleanup_browser = st.button("清理残留测试浏览器")
-    with force_cleanup_col:
+    # Rarely used maintenance actions stay collapsed so normal reruns render fewer widgets.
+    with st.expander("浏览器维护", expanded=False):
+        close_col, cleanup_col = st.columns(2)
+        close_browser = close_col.button("关闭登录浏览器")
+        cleanup_browser = cleanup_col.button("清理残留测试浏览器")
         force_cleanup = st.button("强力清理Chromium")
 
     if close_browser:
@@ -1121,37 +1512,39 @@ def main() -> None:
 
                 # Hard gate: never collect unless user explicitly confirms login.
                 if not login_confirmed:
-                    try:
-                        page.context.storage_state(path=STORAGE_STATE_FILE)
-                    except Exception:
-                        pass
+                    maybe_save_storage_state(page.context)
                     st.warning("未勾选“我已完成登录”，本次不会执行采集。请完成登录并勾选后再点击开始生成。")
                     return
 
                 if login_confirmed:
                     st.info("已按“我已完成登录”继续抓取。")
 
-                try:
-                    page.context.storage_state(path=STORAGE_STATE_FILE)
-                except Exception:
-                    pass
+                maybe_save_storage_state(page.context)
                 active_url = page.url or url
-                close_extra_pages(page.context, page)
+                if browser_session.get("page_count", 1) > 1:
+                    close_extra_pages(page.context, page)
 
-                info = parse_product_info(
-                    active_url,
-                    cookie_text=cookie_input,
-                    live_page=page,
-                )
+                try:
+                    info = cached_parse_product_info(
+                        url,
+                        cookie_fingerprint(cookie_input),
+                        active_url,
+                        _cookie_text=cookie_input,
+                        _live_page=page,
+                    )
+                except IncompleteScrapeError as exc:
+                    info = exc.info
             except Exception as exc:
                 if browser_session and browser_session.get("page"):
-                    try:
-                        browser_session["page"].context.storage_state(path=STORAGE_STATE_FILE)
-                    except Exception:
-                        pass
+                    maybe_save_storage_state(browser_session["page"].context)
                 st.exception(exc)
                 return
-            copy_result = generate_ai_copy(info)
+            ai_preview = st.empty()
+            copy_result = generate_ai_copy(
+                info,
+                on_progress=lambda partial: ai_preview.code(partial, language="json"),
+            )
+            ai_preview.empty()
 
         st.subheader("抓取结果")
         st.write(f"- 标题: {info.title or '未提取到'}")
@@ -1184,8 +1577,7 @@ def main() -> None:
         with col1:
             st.markdown("**主图**")
             if info.images:
-                for image in info.images:
-                    st.image(image, use_container_width=True)
+                st.image(info.images, use_container_width=True)
             else:
                 st.info("未提取到主图。")
         with col2: